@@ -1,9 +1,19 @@
 import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import json
+import logging
 import os
+import threading
 import uuid
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 #test codegpt
 st.set_page_config(
     page_title="Fruit Store CRUD",
@@ -13,208 +23,373 @@ st.set_page_config(
 
 
 DATA_DIR = "data"
-DATA_FILE = os.path.join(DATA_DIR, "fruits.json")
+# The inventory is a Feather snapshot plus an append-only log of changes made
+# since: one fruit record per line, a later record for the same id replaces
+# it and {"id": ..., "deleted": true} removes it
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "fruits.feather")
+DATA_FILE = os.path.join(DATA_DIR, "fruits.jsonl")
+# Tracked seed data (and the store used by older versions of the app); the
+# two files above are generated from it on first run
+LEGACY_DATA_FILE = os.path.join(DATA_DIR, "fruits.json")
+
+CATEGORIES = ["Fresh", "Frozen", "Dried", "Exotic"]
+INVENTORY_COLUMNS = ["name", "price", "quantity", "category", "description"]
+FRUIT_FIELDS = ["id"] + INVENTORY_COLUMNS + ["created_at", "updated_at"]
+
+logger = logging.getLogger(__name__)
 
 
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
 
-def load_data():
+# Callers catch ValueError: it covers orjson's and the stdlib's
+# JSONDecodeError, and the UnicodeDecodeError the stdlib raises for bytes
+# cut off inside a multi-byte character
+def _loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def _read_inventory():
+    # Returns the live fruits, the number of log records and whether the
+    # snapshot could be read
+    fruits = {}
+    snapshot_ok = True
+    if os.path.exists(SNAPSHOT_FILE):
+        try:
+            snapshot = feather.read_feather(SNAPSHOT_FILE).to_dict("records")
+        except (pa.ArrowInvalid, OSError):
+            # Keep the app usable with whatever the log still holds, but the
+            # caller must not compact over the only copy of the snapshot
+            logger.exception("Unreadable snapshot %s", SNAPSHOT_FILE)
+            snapshot = []
+            snapshot_ok = False
+        for fruit in snapshot:
+            fruits[fruit["id"]] = fruit
+
+    # Replaying is idempotent, so a log left over from an interrupted
+    # compaction is harmless
+    lines = 0
     if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    else:
-        # Create empty file if it doesn't exist
-        with open(DATA_FILE, "w") as f:
-            json.dump([], f)
-        return []
+        with open(DATA_FILE, "rb") as f:
+            for line in f:
+                try:
+                    record = _loads(line)
+                except ValueError:
+                    # Blank or torn line, e.g. from a crash mid-append;
+                    # append_records starts the next record on a fresh line
+                    continue
+                lines += 1
+                if record.get("deleted"):
+                    fruits.pop(record["id"], None)
+                else:
+                    fruits[record["id"]] = record
+    return list(fruits.values()), lines, snapshot_ok
+
+
+def _fsync_dir(path):
+    # Makes a rename inside path durable; directories can't be opened on Windows
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _write_snapshot(fruits):
+    sink = pa.BufferOutputStream()
+    feather.write_feather(pd.DataFrame(fruits, columns=FRUIT_FIELDS), sink)
+
+    tmp_file = SNAPSHOT_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(sink.getvalue())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, SNAPSHOT_FILE)
+    _fsync_dir(DATA_DIR)
+
+    # Only once the snapshot is durable is every record in the log redundant
+    open(DATA_FILE, "wb").close()
+
+
+@st.cache_resource
+def _store_lock():
+    # One lock per process: each session runs in its own thread, and a
+    # compaction must not drop records appended between its read and write
+    return threading.Lock()
+
+
+def index_search_fields(fruit):
+    # Lowercased copies for the search box, kept in memory only
+    fruit["_name_lc"] = fruit["name"].lower()
+    fruit["_category_lc"] = fruit["category"].lower()
+    fruit["_description_lc"] = (fruit["description"] or "").lower()
+    return fruit
+
+
+def init_store():
+    # Create the store on first run from the single-document JSON seed file.
+    # Kept out of the cached load_data so the write happens exactly once
+    # rather than on cache misses.
+    with _store_lock():
+        if os.path.exists(SNAPSHOT_FILE) or os.path.exists(DATA_FILE):
+            return
+        fruits = []
+        if os.path.exists(LEGACY_DATA_FILE):
+            with open(LEGACY_DATA_FILE, "rb") as f:
+                try:
+                    fruits = _loads(f.read())
+                except ValueError:
+                    pass
+        _write_snapshot(fruits)
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def load_data(mtimes):
+    # mtimes only key the cache, so any write to the snapshot or the log
+    # invalidates it; max_entries=1 evicts the stale copy rather than
+    # keeping one per write. Returns the same triple as _read_inventory.
+    with _store_lock():
+        fruits, lines, snapshot_ok = _read_inventory()
+    for fruit in fruits:
+        index_search_fields(fruit)
+    return fruits, lines, snapshot_ok
+
+
+def append_records(records):
+    # Keys starting with "_" are in-memory caches and are not persisted
+    records = [{k: v for k, v in record.items() if not k.startswith("_")} for record in records]
+    with _store_lock():
+        data = b"".join(_dumps(record) + b"\n" for record in records)
+        with open(DATA_FILE, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    # Close off a line torn by a crash mid-append so the new
+                    # records don't get glued onto it and skipped on replay
+                    data = b"\n" + data
+            f.write(data)
+        st.session_state.log_lines += len(records)
+
+        # Fold the log into a new snapshot once it holds more than a quarter
+        # as many records as the inventory. Re-read from disk rather than
+        # trusting this session's list, which may be missing other sessions'
+        # records; the lock keeps new ones from landing in between. A
+        # snapshot that can't be read is left alone so it can be recovered;
+        # the log keeps growing in the meantime.
+        if st.session_state.log_lines > len(st.session_state.fruits) / 4:
+            fruits, _, snapshot_ok = _read_inventory()
+            if snapshot_ok:
+                _write_snapshot(fruits)
+                st.session_state.log_lines = 0
+            else:
+                st.session_state.snapshot_ok = False
+
+
+def apply_inventory_changes(rows, changes):
+    # rows is the list shown in the editor; changes is its widget state,
+    # which refers to rows by position
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    updated = {}
+    for pos, values in changes["edited_rows"].items():
+        fruit = index_search_fields({**rows[int(pos)], **values, "updated_at": now})
+        updated[fruit["id"]] = fruit
 
+    deleted = {rows[pos]["id"] for pos in changes["deleted_rows"]}
 
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    added = []
+    for values in changes["added_rows"]:
+        if not values.get("name"):
+            continue
+        added.append(index_search_fields({
+            "id": uuid.uuid4().hex,
+            "name": values["name"],
+            "price": values.get("price", 0.01),
+            "quantity": values.get("quantity", 1),
+            "category": values.get("category", "Fresh"),
+            "description": values.get("description") or "",
+            "created_at": now,
+            "updated_at": now
+        }))
+
+    st.session_state.fruits = [
+        updated.get(fruit["id"], fruit)
+        for fruit in st.session_state.fruits
+        if fruit["id"] not in deleted
+    ] + added
+    st.session_state.pop("fruits_df", None)
+    append_records(
+        list(updated.values())
+        + [{"id": fruit_id, "deleted": True} for fruit_id in deleted]
+        + added
+    )
 
 
 if 'fruits' not in st.session_state:
-    st.session_state.fruits = load_data()
-if 'edit_mode' not in st.session_state:
-    st.session_state.edit_mode = False
-if 'edit_id' not in st.session_state:
-    st.session_state.edit_id = None
+    init_store()
+    (
+        st.session_state.fruits,
+        st.session_state.log_lines,
+        st.session_state.snapshot_ok
+    ) = load_data(tuple(
+        os.path.getmtime(path) if os.path.exists(path) else 0
+        for path in (SNAPSHOT_FILE, DATA_FILE)
+    ))
 
 
 st.title("🍎 Fruit Store Inventory Management")
 
+if not st.session_state.get("snapshot_ok", True):
+    st.error(
+        f"The inventory snapshot {SNAPSHOT_FILE} could not be read, so only "
+        "changes made since it was written are shown. It will not be "
+        "overwritten until it is restored or removed."
+    )
+
 
 with st.sidebar:
-    st.header("Add/Edit Fruit")
+    st.header("Add Fruit")
     
-    # Form for adding/editing fruits
-    with st.form(key="fruit_form"):
-        name = st.text_input("Fruit Name", key="name")
-        price = st.number_input("Price ($)", min_value=0.01, step=0.01, key="price")
-        quantity = st.number_input("Quantity", min_value=1, step=1, key="quantity")
-        category = st.selectbox("Category", ["Fresh", "Frozen", "Dried", "Exotic"], key="category")
-        description = st.text_area("Description", key="description")
+    # Form for adding fruits; existing ones are edited in the inventory table
+    with st.form(key="fruit_form", clear_on_submit=True):
+        name = st.text_input("Fruit Name")
+        price = st.number_input("Price ($)", min_value=0.01, step=0.01)
+        quantity = st.number_input("Quantity", min_value=1, step=1)
+        category = st.selectbox("Category", CATEGORIES)
+        description = st.text_area("Description")
         
-        submit_button = st.form_submit_button(
-            "Update Fruit" if st.session_state.edit_mode else "Add Fruit"
-        )
+        submit_button = st.form_submit_button("Add Fruit")
         
         if submit_button:
             if not name:
                 st.error("Fruit name cannot be empty!")
             else:
-                if st.session_state.edit_mode:
-                    # Update existing fruit
-                    for i, fruit in enumerate(st.session_state.fruits):
-                        if fruit["id"] == st.session_state.edit_id:
-                            st.session_state.fruits[i] = {
-                                "id": st.session_state.edit_id,
-                                "name": name,
-                                "price": price,
-                                "quantity": quantity,
-                                "category": category,
-                                "description": description,
-                                "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            break
-                    st.session_state.edit_mode = False
-                    st.session_state.edit_id = None
-                    st.success(f"Updated {name} successfully!")
-                else:
-                    # Add new fruit
-                    new_fruit = {
-                        "id": str(uuid.uuid4()),
-                        "name": name,
-                        "price": price,
-                        "quantity": quantity,
-                        "category": category,
-                        "description": description,
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    st.session_state.fruits.append(new_fruit)
-                    st.success(f"Added {name} successfully!")
+                # Add new fruit
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                new_fruit = index_search_fields({
+                    "id": uuid.uuid4().hex,
+                    "name": name,
+                    "price": price,
+                    "quantity": quantity,
+                    "category": category,
+                    "description": description,
+                    "created_at": now,
+                    "updated_at": now
+                })
+                st.session_state.fruits.append(new_fruit)
+                st.session_state.pop("fruits_df", None)
+                st.success(f"Added {name} successfully!")
                 
                 # Save data to file
-                save_data(st.session_state.fruits)
-                
-                # Clear form fields
-                st.session_state.name = ""
-                st.session_state.price = 0.01
-                st.session_state.quantity = 1
-                st.session_state.category = "Fresh"
-                st.session_state.description = ""
-    
-    if st.session_state.edit_mode:
-        if st.button("Cancel Edit"):
-            st.session_state.edit_mode = False
-            st.session_state.edit_id = None
-            st.session_state.name = ""
-            st.session_state.price = 0.01
-            st.session_state.quantity = 1
-            st.session_state.category = "Fresh"
-            st.session_state.description = ""
-            st.experimental_rerun()
-
-
-st.header("Fruit Inventory")
-
-
-search_term = st.text_input("Search fruits", "")
-
-
-filtered_fruits = st.session_state.fruits
-if search_term:
-    filtered_fruits = [
-        fruit for fruit in st.session_state.fruits
-        if search_term.lower() in fruit["name"].lower() or 
-           search_term.lower() in fruit["category"].lower() or
-           search_term.lower() in fruit["description"].lower()
-    ]
-
-
-if not filtered_fruits:
-    st.info("No fruits in inventory. Add some from the sidebar!")
-else:
-    # Create columns for the table header
-    col1, col2, col3, col4, col5, col6 = st.columns([2, 1, 1, 1, 3, 2])
-    col1.markdown("**Name**")
-    col2.markdown("**Price**")
-    col3.markdown("**Quantity**")
-    col4.markdown("**Category**")
-    col5.markdown("**Description**")
-    col6.markdown("**Actions**")
-    
-    st.markdown("---")
-    
-    # Display each fruit
-    for fruit in filtered_fruits:
-        col1, col2, col3, col4, col5, col6 = st.columns([2, 1, 1, 1, 3, 2])
-        col1.write(fruit["name"])
-        col2.write(f"${fruit['price']:.2f}")
-        col3.write(fruit["quantity"])
-        col4.write(fruit["category"])
-        col5.write(fruit["description"][:50] + "..." if len(fruit["description"]) > 50 else fruit["description"])
-        
-        # Edit and Delete buttons
-        edit_button = col6.button("Edit", key=f"edit_{fruit['id']}")
-        delete_button = col6.button("Delete", key=f"delete_{fruit['id']}")
-        
-        if edit_button:
-            # Set edit mode and populate form with fruit data
-            st.session_state.edit_mode = True
-            st.session_state.edit_id = fruit["id"]
-            st.session_state.name = fruit["name"]
-            st.session_state.price = fruit["price"]
-            st.session_state.quantity = fruit["quantity"]
-            st.session_state.category = fruit["category"]
-            st.session_state.description = fruit["description"]
-            st.experimental_rerun()
-        
-        if delete_button:
-            # Remove fruit from list
-            st.session_state.fruits = [f for f in st.session_state.fruits if f["id"] != fruit["id"]]
-            save_data(st.session_state.fruits)
-            st.success(f"Deleted {fruit['name']} successfully!")
-            st.experimental_rerun()
-        
-        st.markdown("---")
+                append_records([new_fruit])
+
+
+# Searching only reruns this fragment; saving table edits reruns the whole
+# app so the statistics pick up the change
+@st.fragment
+def render_inventory():
+    st.header("Fruit Inventory")
+
 
+    search_term = st.text_input("Search fruits", "")
+
+
+    filtered_fruits = st.session_state.fruits
+    if search_term:
+        term = search_term.lower()
+        filtered_fruits = [
+            fruit for fruit in st.session_state.fruits
+            if term in fruit["_name_lc"]
+            or term in fruit["_category_lc"]
+            or term in fruit["_description_lc"]
+        ]
+
+
+    if not filtered_fruits:
+        st.info("No fruits in inventory. Add some from the sidebar!")
+        return
+
+    df = pd.DataFrame(filtered_fruits, columns=INVENTORY_COLUMNS)
+
+    # Edit cells, add rows or select and delete rows, then save them together
+    with st.form(key="inventory_form"):
+        st.data_editor(
+            df,
+            key="inv",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "name": st.column_config.TextColumn("Name", required=True),
+                "price": st.column_config.NumberColumn(
+                    "Price", min_value=0.01, step=0.01, format="$%.2f",
+                    default=0.01, required=True
+                ),
+                "quantity": st.column_config.NumberColumn(
+                    "Quantity", min_value=1, step=1, default=1, required=True
+                ),
+                "category": st.column_config.SelectboxColumn(
+                    "Category", options=CATEGORIES, default="Fresh", required=True
+                ),
+                "description": st.column_config.TextColumn("Description", default="")
+            }
+        )
+
+        if st.form_submit_button("Save Changes"):
+            apply_inventory_changes(filtered_fruits, st.session_state.inv)
+            st.rerun()
+
+
+@st.fragment
+def render_statistics():
+    if not st.session_state.fruits:
+        return
 
-if st.session_state.fruits:
     st.header("Inventory Statistics")
     
     col1, col2, col3 = st.columns(3)
     
     
-    col1.metric("Total Fruit Types", len(st.session_state.fruits))
+    # Built once per change to the inventory; dropped wherever
+    # st.session_state.fruits is modified
+    if "fruits_df" not in st.session_state:
+        st.session_state.fruits_df = pd.DataFrame(
+            st.session_state.fruits, columns=INVENTORY_COLUMNS
+        )
+    df = st.session_state.fruits_df
+    
+    
+    col1.metric("Total Fruit Types", len(df))
     
    
-    total_value = sum(fruit["price"] * fruit["quantity"] for fruit in st.session_state.fruits)
+    total_value = float((df["price"] * df["quantity"]).sum())
     col2.metric("Total Inventory Value", f"${total_value:.2f}")
     
    
-    total_quantity = sum(fruit["quantity"] for fruit in st.session_state.fruits)
+    total_quantity = int(df["quantity"].sum())
     col3.metric("Total Fruit Items", total_quantity)
     
     
     st.subheader("Category Distribution")
-    category_counts = {}
-    for fruit in st.session_state.fruits:
-        category = fruit["category"]
-        if category in category_counts:
-            category_counts[category] += 1
-        else:
-            category_counts[category] = 1
+    category_counts = df["category"].value_counts(sort=False).to_dict()
     
     st.bar_chart(category_counts)
 
+
+render_inventory()
+render_statistics()
+
 # Footer
 st.markdown("---")
 st.markdown("© 2023 Fruit Store CRUD App | Built with Streamlit")